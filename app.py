@@ -1,9 +1,25 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
+import xlsxwriter
+import atexit
+import threading
 import time
+from datetime import datetime, timezone
+from functools import partial
 from io import BytesIO
-from main import YahooFinanceScraper
+from main import YahooFinanceScraper, extend_columns
+
+# Arrow-backed strings make the vectorized .str operations below run on contiguous buffers
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    pa = pc = None
+    STRING_DTYPE = "string"
+
+# Market cap suffixes, converted to billions
+MARKET_CAP_MULTIPLIERS = {"T": 1000.0, "B": 1.0, "M": 0.001}
 
 # Page Configuration
 st.set_page_config(
@@ -12,43 +28,60 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_data(show_spinner=False, ttl=3600)
 def clean_data(data):
     """
-    Cleans and transforms raw scraped data into a structured integer/float DataFrame.
+    Cleans and transforms raw scraped data (a dict of column lists) into a structured integer/float DataFrame.
     """
     if not data:
         return pd.DataFrame()
 
-    df = pd.DataFrame(data)
+    # Column-oriented input builds the frame directly, without a per-row transpose
+    df = pd.DataFrame(data, copy=False)
+    if df.empty:
+        return pd.DataFrame()
+    df = df.astype({col: STRING_DTYPE for col in df.select_dtypes(include=["object", "string"]).columns})
+    
+    # Strip whitespace with one vectorized pass per text column,
+    # directly on the Arrow buffer when pyarrow is available
+    for col in df.select_dtypes(include=["object", "string"]):
+        if pc is not None:
+            df[col] = pd.array(pc.utf8_trim_whitespace(pa.array(df[col])), dtype=STRING_DTYPE)
+        else:
+            df[col] = df[col].str.strip()
+    
+    # Market cap is reported in trillions ("T"), billions ("B") or millions ("M"); normalise to billions.
+    # The string parsing only runs over the unique values, then gets mapped back per row.
+    market_cap = df["market_cap"].astype("category")
+    categories = market_cap.cat.categories.to_series().astype(STRING_DTYPE).str.replace(",", "", regex=False)
+    # One regex pass splits each value into its number and suffix
+    market_cap_parts = categories.str.extract(r"^([\d.]+)([TBM]?)$")
+    market_cap_mult = market_cap_parts[1].map(MARKET_CAP_MULTIPLIERS).astype(float).fillna(1.0)
+    market_cap_values = pd.to_numeric(market_cap_parts[0], errors="coerce").astype(float) * market_cap_mult
     
     # Apply user-defined cleaning logic
     cleaned_df = (
         df
-        .apply(lambda col: col.str.strip() if col.dtype == "object" else col)
         .assign(
-            price=lambda df_: pd.to_numeric(df_["price"].astype(str).str.replace(",", "", regex=False), errors="coerce"),
+            price=lambda df_: pd.to_numeric(df_["price"].str.replace(",", "", regex=False), errors="coerce"),
             change=lambda df_: pd.to_numeric(
-                df_["change"].astype(str).str.replace("+", "", regex=False).str.replace(",", "", regex=False),
+                df_["change"].str.replace("+", "", regex=False).str.replace(",", "", regex=False),
                 errors="coerce"
             ),
             volume=lambda df_: pd.to_numeric(
-                df_["volume"].astype(str)
+                df_["volume"]
                 .str.replace(",", "", regex=False)
-                .str.replace("M", "", regex=False),
+                .str.extract(r"^([\d.]+)M?$", expand=False),
                 errors="coerce"
             ),
-            market_cap=lambda df_: df_["market_cap"].apply(
-                lambda v: (
-                    float(str(v).replace("T", "").replace(",", "")) * 1000
-                    if "T" in str(v)
-                    else float(str(v).replace("B", "").replace(",", ""))
-                ) if isinstance(v, str) and v and v != "N/A" else np.nan
-            ),
+            market_cap=market_cap.map(dict(zip(market_cap.cat.categories, market_cap_values))),
             pe_ratio=lambda df_: pd.to_numeric(
-                df_["pe_ratio"].astype(str).replace("-", np.nan).str.replace(",", "", regex=False),
+                df_["pe_ratio"].str.replace(",", "", regex=False),
                 errors="coerce"
             )
         )
+        # Parsing Arrow strings yields nullable Float64; keep plain float64 columns
+        .astype({"price": float, "change": float, "volume": float, "market_cap": float, "pe_ratio": float})
         .rename(columns={
             "price": "Price (USD)",
             "change": "Change",
@@ -60,78 +93,131 @@ def clean_data(data):
     
     return cleaned_df
 
+@st.cache_data(show_spinner=False, ttl=3600)
 def convert_df_to_csv(df):
     """Converts DataFrame to CSV for download."""
     return df.to_csv(index=False).encode('utf-8')
 
+@st.cache_data(show_spinner=False, ttl=3600)
 def convert_df_to_excel(df):
     """Converts DataFrame to Excel for download."""
     output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Sheet1')
+    # constant_memory flushes each row as soon as the next one starts,
+    # so rows must be written strictly in order (DataFrame.to_excel writes column by column)
+    wb = xlsxwriter.Workbook(output, {'constant_memory': True})
+    ws = wb.add_worksheet('Sheet1')
+    ws.write_row(0, 0, list(df.columns))
+    # Missing values are written as empty cells, matching DataFrame.to_excel
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    for row_idx, row in enumerate(rows, start=1):
+        ws.write_row(row_idx, 0, row)
+    wb.close()
     processed_data = output.getvalue()
     return processed_data
 
+@st.cache_resource(show_spinner=False, validate=lambda scraper: scraper.is_alive())
+def get_scraper(headless=True):
+    """Creates the Selenium scraper once and reuses its browser across reruns."""
+    scraper = YahooFinanceScraper(headless=headless)
+    # cache_resource never tears down its values, so quit Chrome on shutdown
+    atexit.register(scraper.close)
+    return scraper
+
+@st.cache_resource
+def get_scraper_lock():
+    """Serializes access to the shared browser between concurrent sessions."""
+    return threading.Lock()
+
+class EmptyScrapeError(Exception):
+    """Raised when a scrape returns no rows, so the empty result is not cached."""
+
+class IncompleteScrapeError(Exception):
+    """Raised when a scrape stops early on an error, so the partial result is not cached."""
+
+# persist="disk" ignores ttl, so freshness comes from the hourly date_bucket key instead
+@st.cache_data(
+    persist="disk",
+    max_entries=24,
+    show_spinner="Initializing Scraper... Please wait (this make take a few minutes)...",
+)
+def scrape_and_clean(date_bucket):
+    """
+    Scrapes the 'Most Active' table and returns the cleaned DataFrame.
+    Results are saved to disk per date_bucket, so repeat visits skip Selenium entirely.
+    """
+    # Progress bar doubles as the status line, so each update is a single message
+    progress_bar = st.progress(0, text="Navigating to Yahoo Finance...")
+    
+    raw_data = YahooFinanceScraper.empty_columns()
+    total = 0
+    with get_scraper_lock():
+        # Reuse the cached scraper. Fetching it runs the validate check against the
+        # shared browser, so it has to happen under the lock like the scrape itself.
+        # Headless mode is required for Streamlit Cloud
+        scraper = get_scraper(headless=True)
+        # Keep the browser open afterwards so the next run can reuse it
+        for page, total, page_data in scraper.run(close_when_done=False):
+            extend_columns(raw_data, page_data)
+            # Only refresh the UI every other page to cut websocket traffic
+            if page == 1 or page % 2 == 0:
+                # Simple progress update: increase by 10% per page, loop back or cap at 90%
+                progress = min(page * 10, 90)
+                progress_bar.progress(progress, text=f"**Page {page}** — {total} rows")
+        # Read the flag before releasing the lock, while no other session can start a run
+        run_complete = scraper.last_run_complete
+    
+    progress_bar.progress(100, text="Scraping Completed!")
+    
+    if not total:
+        raise EmptyScrapeError("No data was returned. It's possible the layout changed or scraping was blocked.")
+    
+    if not run_complete:
+        raise IncompleteScrapeError(f"Scraping stopped early after {total} rows; please try again.")
+    
+    return clean_data(raw_data)
+
 # App Logic
 st.title("📈 Yahoo Finance Most Active Stocks Scraper")
 st.write("Click the button below to scrape the latest 'Most Active' stocks data from Yahoo Finance.")
 
 if st.button("🚀 Scrape Data"):
-    with st.spinner("Initializing Scraper... Please wait (this make take a few minutes)..."):
-        try:
-            # Initialize Scraper
-            # Headless mode is required for Streamlit Cloud
-            scraper = YahooFinanceScraper(headless=True)
-            
-            # Progress bar placeholder
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            status_text.text("Navigating to Yahoo Finance...")
-            
-            # We need to modify the run method or just use the public methods to update progress
-            raw_data = []
-            for page, total, data_snapshot in scraper.run():
-                raw_data = data_snapshot
-                status_text.text(f"Scraping page {page}... Collected {total} rows.")
-                # Simple progress update: increase by 10% per page, loop back or cap at 90%
-                progress = min(page * 10, 90)
-                progress_bar.progress(progress)
-            
-            progress_bar.progress(100)
-            status_text.text("Scraping Completed!")
-            
-            if raw_data:
-                st.success(f"Successfully scraped {len(raw_data)} rows!")
-                
-                # Cleanup
-                clean_df = clean_data(raw_data)
-                
-                # Display Data
-                st.dataframe(clean_df, use_container_width=True)
-                
-                # Download Columns
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    csv = convert_df_to_csv(clean_df)
-                    st.download_button(
-                        label="📥 Download as CSV",
-                        data=csv,
-                        file_name='yahoo_finance_most_active.csv',
-                        mime='text/csv',
-                    )
-                
-                with col2:
-                    excel = convert_df_to_excel(clean_df)
-                    st.download_button(
-                        label="📥 Download as Excel",
-                        data=excel,
-                        file_name='yahoo_finance_most_active.xlsx',
-                        mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                    )
-            else:
-                st.warning("No data was returned. It's possible the layout changed or scraping was blocked.")
-                
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
+    try:
+        date_bucket = datetime.now(timezone.utc).strftime("%Y-%m-%d-%H")
+        # Keep the results across reruns (e.g. download button clicks)
+        st.session_state["clean_df"] = scrape_and_clean(date_bucket)
+    except EmptyScrapeError as e:
+        # Don't leave the previous result on screen under a failed scrape
+        st.session_state.pop("clean_df", None)
+        st.warning(str(e))
+    except Exception as e:
+        st.session_state.pop("clean_df", None)
+        st.error(f"An error occurred: {e}")
+
+clean_df = st.session_state.get("clean_df")
+
+if clean_df is not None:
+    st.success(f"Successfully scraped {len(clean_df)} rows!")
+    
+    # Display Data
+    st.dataframe(clean_df, use_container_width=True)
+    
+    # Download Columns
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        csv = convert_df_to_csv(clean_df)
+        st.download_button(
+            label="📥 Download as CSV",
+            data=csv,
+            file_name='yahoo_finance_most_active.csv',
+            mime='text/csv',
+        )
+    
+    with col2:
+        # Excel is the expensive export, so only build it once the button is clicked
+        st.download_button(
+            label="📥 Download as Excel",
+            data=partial(convert_df_to_excel, clean_df),
+            file_name='yahoo_finance_most_active.xlsx',
+            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
@@ -3,6 +3,10 @@ import time
 import os
 from typing import List, Dict, Optional, Any
 
+import lxml.html
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service as ChromeService
 from selenium.webdriver.common.by import By
@@ -22,6 +26,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def extend_columns(target: Dict[str, List[str]], source: Dict[str, List[str]]) -> None:
+    """Append the rows of one column-oriented batch onto another, column by column."""
+    for col, values in source.items():
+        target.setdefault(col, []).extend(values)
+
 class YahooFinanceScraper:
     """
     A robust scraper for Yahoo Finance 'Most Active' stocks using Selenium.
@@ -30,6 +39,10 @@ class YahooFinanceScraper:
 
     BASE_URL = "https://finance.yahoo.com/"
     MOST_ACTIVE_URL = "https://finance.yahoo.com/markets/stocks/most-active/"
+    SCREENER_URL = "https://query1.finance.yahoo.com/v1/finance/screener/predefined/saved"
+    # (connect, read) timeout in seconds for direct API calls
+    API_TIMEOUT = (3, 10)
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     
     # Locators
     NAV_CONTAINER = (By.ID, "navigation-container")
@@ -42,13 +55,45 @@ class YahooFinanceScraper:
     TABLE_ROWS = (By.CSS_SELECTOR, "table tbody tr")
     NEXT_BUTTON = (By.XPATH, "//*[@id='main-content-wrapper']/section[1]/div/div[4]/div[3]/button[3]")
 
+    # Output column -> index of the matching <td> in a table row
+    COLUMN_CELLS = {
+        "symbol": 0,
+        "name": 1,
+        "price": 3,
+        "change": 4,
+        "volume": 6,
+        "market_cap": 8,
+        "pe_ratio": 9
+    }
+
+    # Returns the table markup so it can be parsed in-process with lxml
+    TABLE_HTML_SCRIPT = "const t = document.querySelector('table'); return t ? t.outerHTML : '';"
+    FIRST_ROW_SCRIPT = "const r = document.querySelector('table tbody tr'); return r ? r.innerText : null;"
+
     def __init__(self, headless: bool = False):
         """
-        Initialize the scraper with a Chrome driver.
+        Initialize the scraper and its Chrome options.
+        The browser itself is only started when the Selenium fallback first needs it.
         
         Args:
             headless: Whether to run the browser in headless mode.
         """
+        self.user_agent = self.USER_AGENT
+        
+        # Shared HTTP session: keep-alive connections, gzip and retries for all direct requests
+        self.session = requests.Session()
+        self.session.headers.update({
+            "User-Agent": self.user_agent,
+            "Accept-Encoding": "gzip, deflate",
+        })
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=4,
+            # At most one connect/read retry, so an unreachable or hung host falls back to Selenium quickly
+            max_retries=Retry(total=3, connect=1, read=1, backoff_factor=0.3)
+        )
+        self.session.mount("https://", adapter)
+        
         self.options = webdriver.ChromeOptions()
         if headless:
             self.options.add_argument("--headless")
@@ -63,18 +108,39 @@ class YahooFinanceScraper:
         self.options.add_argument("--disable-gpu")
         self.options.add_argument("--disable-software-rasterizer")
         self.options.add_argument("--disable-notifications")
-        self.options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+        # Skip Chrome subsystems a headless scraper never needs
+        self.options.add_argument("--disable-background-networking")
+        self.options.add_argument("--disable-sync")
+        self.options.add_argument("--metrics-recording-only")
+        self.options.add_argument(f"user-agent={self.user_agent}")
         
         # CRITICAL PERFORMANCE BOOST: Disable images and CSS
         prefs = {
             "profile.managed_default_content_settings.images": 2,  # Disable images
+            "profile.managed_default_content_settings.stylesheets": 2,  # Disable CSS
+            "profile.managed_default_content_settings.fonts": 2,  # Disable web fonts
+            "profile.managed_default_content_settings.plugins": 2,  # Disable plugins
+            "profile.managed_default_content_settings.popups": 2,  # Block popups
             "profile.default_content_setting_values.notifications": 2,  # Disable notifications
         }
         self.options.add_experimental_option("prefs", prefs)
+        self.options.add_argument("--blink-settings=imagesEnabled=false")
         
         # Use 'eager' page load strategy (don't wait for all resources)
         self.options.page_load_strategy = 'eager'
         
+        self.driver = None
+        self.wait = None
+        # Set by run(): False if the last run stopped early on an error
+        self.last_run_complete = False
+        # Set by the page helpers when they swallow an error, so run() can't report a clean finish
+        self._run_interrupted = False
+
+    def _ensure_driver(self) -> None:
+        """Start the Chrome driver if it isn't running yet."""
+        if self.driver:
+            return
+        
         # Use system chromium-driver for Streamlit Cloud compatibility
         # On Streamlit Cloud, chromium-driver is installed via packages.txt
         chromium_driver_path = os.getenv('CHROMIUM_DRIVER_PATH', '/usr/bin/chromedriver')
@@ -110,9 +176,17 @@ class YahooFinanceScraper:
         """Wait for an element to be clickable."""
         return WebDriverWait(self.driver, timeout).until(EC.element_to_be_clickable(locator))
 
-    def _hover(self, element: Any) -> None:
-        """Hover over a web element."""
-        ActionChains(self.driver).move_to_element(element).pause(0.2).perform()
+    def _hover(self, element: Any, reveals: Optional[tuple] = None) -> None:
+        """
+        Hover over a web element.
+        
+        Args:
+            element: The element to hover over.
+            reveals: Optional locator of a submenu item to wait for instead of a fixed pause.
+        """
+        ActionChains(self.driver).move_to_element(element).perform()
+        if reveals:
+            self._wait_visible(reveals)
 
     def _safe_click(self, locator: tuple, timeout: int = 10) -> None:
         """Safely click an element by scrolling it into view first."""
@@ -125,8 +199,9 @@ class YahooFinanceScraper:
             raise
 
     def navigate_to_most_active(self) -> None:
-        """Navigate directly to the 'Most Active' stocks page."""
+        """Navigate directly to the 'Most Active' stocks page, starting the browser if needed."""
         try:
+            self._ensure_driver()
             logger.info(f"Navigating directly to {self.MOST_ACTIVE_URL}")
             self.driver.get(self.MOST_ACTIVE_URL)
             self._wait_for_page_load()
@@ -140,29 +215,34 @@ class YahooFinanceScraper:
             logger.error(traceback.format_exc())
             raise
 
-    def scrape_current_page(self) -> List[Dict[str, str]]:
-        """Scrape stock data from the current page's table."""
-        data = []
+    @classmethod
+    def empty_columns(cls) -> Dict[str, List[str]]:
+        """Return an empty column-oriented batch (column name -> list of values)."""
+        return {col: [] for col in cls.COLUMN_CELLS}
+
+    def scrape_current_page(self) -> Dict[str, List[str]]:
+        """Scrape stock data from the current page's table, one list per column."""
+        data = self.empty_columns()
+        count = 0
         try:
             # Ensure table is present
             self._wait_visible(self.TABLE)
-            rows = self.driver.find_elements(*self.TABLE_ROWS)
+            # Fetch the table markup in a single round-trip and parse it locally
+            html = self.driver.execute_script(self.TABLE_HTML_SCRIPT)
+            if not html:
+                return data
+            rows = lxml.html.fromstring(html).xpath(".//tbody/tr")
+            # Row count is known up front, so fill preallocated column lists by index
+            data = {col: [None] * len(rows) for col in self.COLUMN_CELLS}
             
             for row in rows:
-                cols = row.find_elements(By.TAG_NAME, "td")
-                if len(cols) < 10:
+                cells = [cell.text_content().strip() for cell in row.xpath("./td")]
+                if len(cells) < 10:
                     continue
                 
-                stock_data = {
-                    "symbol": cols[0].text.strip(),
-                    "name": cols[1].text.strip(),
-                    "price": cols[3].text.strip(),
-                    "change": cols[4].text.strip(),
-                    "volume": cols[6].text.strip(),
-                    "market_cap": cols[8].text.strip(),
-                    "pe_ratio": cols[9].text.strip()
-                }
-                data.append(stock_data)
+                for col, cell_idx in self.COLUMN_CELLS.items():
+                    data[col][count] = cells[cell_idx]
+                count += 1
 
         except StaleElementReferenceException:
             logger.warning("Stale element encountered during scraping. Retrying page...")
@@ -170,21 +250,96 @@ class YahooFinanceScraper:
             return self.scrape_current_page()
         except Exception as e:
             logger.error(f"Error scraping page: {e}")
+            self._run_interrupted = True
         
+        # Drop the unused slots left by skipped rows
+        for values in data.values():
+            del values[count:]
         return data
 
+    @staticmethod
+    def _format_quote(quote: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Format a screener API quote into the same string fields the table scrape produces.
+        Raises KeyError/TypeError if the quote lacks a symbol or a numeric price, so a
+        changed schema is treated as a failed API call rather than a table of blanks.
+        """
+        symbol = quote.get("symbol")
+        if not isinstance(symbol, str) or not symbol.strip():
+            raise KeyError(f"Quote has no symbol: {quote!r}")
+        price = quote["regularMarketPrice"]
+        if isinstance(price, bool) or not isinstance(price, (int, float)):
+            raise TypeError(f"Quote {symbol} has a non-numeric regularMarketPrice: {price!r}")
+
+        def fmt(value: Any, template: str, na: str = "N/A") -> str:
+            return template.format(value) if isinstance(value, (int, float)) else na
+
+        market_cap = quote.get("marketCap")
+        if isinstance(market_cap, (int, float)):
+            if market_cap >= 1e12:
+                market_cap = f"{market_cap / 1e12:,.3f}T"
+            elif market_cap >= 1e9:
+                market_cap = f"{market_cap / 1e9:,.3f}B"
+            else:
+                market_cap = f"{market_cap / 1e6:,.3f}M"
+        else:
+            market_cap = "N/A"
+
+        volume = quote.get("regularMarketVolume")
+        return {
+            "symbol": symbol,
+            "name": quote.get("longName") or quote.get("shortName") or "",
+            "price": f"{price:,.2f}",
+            "change": fmt(quote.get("regularMarketChange"), "{:+,.2f}"),
+            "volume": fmt(volume / 1e6 if isinstance(volume, (int, float)) else None, "{:,.3f}M"),
+            "market_cap": market_cap,
+            "pe_ratio": fmt(quote.get("trailingPE"), "{:,.2f}", na="-"),
+        }
+
+    def _api_scrape(self) -> Optional[Dict[str, List[str]]]:
+        """
+        Fetch all 'Most Active' rows from Yahoo's screener JSON endpoint in one request.
+        Returns None if the request fails or the response doesn't match the expected schema.
+        """
+        try:
+            response = self.session.get(
+                self.SCREENER_URL,
+                params={"scrIds": "most_actives", "count": 250},
+                timeout=self.API_TIMEOUT
+            )
+            if response.status_code != 200:
+                logger.warning(f"Screener API returned status {response.status_code}.")
+                return None
+            quotes = response.json()["finance"]["result"][0]["quotes"]
+            data = self.empty_columns()
+            for quote in quotes:
+                if not isinstance(quote, dict):
+                    raise TypeError(f"Expected quote object, got {type(quote).__name__}")
+                for col, value in self._format_quote(quote).items():
+                    data[col].append(value)
+            return data
+        except requests.RequestException as e:
+            logger.warning(f"Screener API request failed: {e}")
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+            logger.warning(f"Unexpected screener API response: {e}")
+        return None
+
     def go_to_next_page(self) -> bool:
         """
         Attempt to click the 'Next' button.
         Returns True if successful, False if button not found or disabled.
+        Any other failure also returns False but marks the current run as interrupted.
         """
         try:
             # Capture first row text to verify page transition
-            first_rows = self.driver.find_elements(*self.TABLE_ROWS)
-            first_row_check = first_rows[0].text if first_rows else None
+            first_row_check = self._first_row_text()
 
-            # Find and click next button
-            btn = self._wait_clickable(self.NEXT_BUTTON, timeout=2)
+            # Find and click next button; a missing button is the normal end of pagination
+            try:
+                btn = self._wait_clickable(self.NEXT_BUTTON, timeout=2)
+            except TimeoutException:
+                logger.info("No 'Next' button found or clickable. End of pagination.")
+                return False
             
             # Check if button is disabled (if applicable, though Yahoo mostly hides it)
             if "disabled" in btn.get_attribute("class"):
@@ -200,53 +355,109 @@ class YahooFinanceScraper:
                 )
             
             return True
-        except TimeoutException:
-            logger.info("No 'Next' button found or clickable. End of pagination.")
-            return False
         except Exception as e:
+            # Includes the table never changing after the click
             logger.error(f"Error navigating to next page: {e}")
+            self._run_interrupted = True
             return False
 
+    def _first_row_text(self) -> Optional[str]:
+        """Return the text of the table's first row in a single round-trip, or None if there are no rows."""
+        return self.driver.execute_script(self.FIRST_ROW_SCRIPT)
+
     def _has_table_changed(self, old_first_row_text: str) -> bool:
         """Check if the table content has changed after navigation."""
+        first_row_text = self._first_row_text()
+        if first_row_text is None:
+            return False
+        return first_row_text != old_first_row_text
+
+    def is_alive(self) -> bool:
+        """
+        Check whether the scraper can still be used.
+        A scraper whose browser was never started (or was closed) is usable, since
+        the driver is created again on demand.
+        """
+        if not self.driver:
+            return True
         try:
-            rows = self.driver.find_elements(*self.TABLE_ROWS)
-            if not rows:
-                return False
-            return rows[0].text != old_first_row_text
-        except StaleElementReferenceException:
+            self.driver.execute_script("return 1")
+            return True
+        except WebDriverException as e:
+            logger.warning(f"Browser session is no longer usable: {e}")
+            # Quit the hung or dead browser so the replacement doesn't leak it
+            try:
+                self.close()
+            except Exception as close_error:
+                logger.warning(f"Failed to close unusable browser: {close_error}")
             return False
 
     def close(self):
-        """Close the browser instance."""
+        """Close the browser instance and the HTTP session."""
+        self.session.close()
         if self.driver:
-            self.driver.quit()
-            logger.info("Browser closed.")
+            try:
+                self.driver.quit()
+                logger.info("Browser closed.")
+            except Exception as e:
+                # The driver may already be dead (crashed Chrome, killed chromedriver)
+                logger.warning(f"Browser did not quit cleanly: {e}")
+            finally:
+                self.driver = None
 
-    def run(self):
+    def run(self, close_when_done: bool = True):
         """
         Main execution method.
-        Yields tuple (page_num, total_rows, current_data_snapshot) for progress tracking.
+        Yields tuple (page_num, total_rows, page_data) for progress tracking, where
+        page_data is a column-oriented dict (see empty_columns) holding only the rows
+        scraped from that page.
+        
+        The screener JSON endpoint is tried first and, when it works, yields a single
+        (1, total_rows, rows) update. Otherwise the table is scraped page by page with
+        Selenium, starting from a fresh load of the 'Most Active' page so a long-lived
+        scraper can be reused across runs.
+        
+        Errors are logged rather than raised, so callers should check
+        last_run_complete afterwards to tell a finished run from a partial one.
+        
+        Args:
+            close_when_done: Whether to quit the browser once the run finishes.
+                Pass False to keep the driver alive for the next run.
         """
-        all_data = []
+        self.last_run_complete = False
+        self._run_interrupted = False
+        total_rows = 0
         page_num = 1
         
         try:
+            api_data = self._api_scrape()
+            if api_data and api_data["symbol"]:
+                total_rows = len(api_data["symbol"])
+                logger.info(f"Collected {total_rows} rows from the screener API.")
+                yield 1, total_rows, api_data
+                self.last_run_complete = True
+                return
+            
+            logger.info("Falling back to scraping the table with Selenium...")
             self.navigate_to_most_active()
             
             while True:
                 logger.info(f"Scraping page {page_num}...")
                 page_data = self.scrape_current_page()
-                all_data.extend(page_data)
-                logger.info(f"Collected {len(page_data)} rows from page {page_num}. Total: {len(all_data)}")
+                page_rows = len(page_data["symbol"])
+                total_rows += page_rows
+                logger.info(f"Collected {page_rows} rows from page {page_num}. Total: {total_rows}")
                 
-                # Yield progress update
-                yield page_num, len(all_data), all_data
+                # Yield progress update with just the new rows; callers accumulate them
+                yield page_num, total_rows, page_data
                 
                 if not self.go_to_next_page():
                     break
                     
                 page_num += 1
+            
+            # Pagination stopping because a helper hit an error is not a clean finish
+            self.last_run_complete = not self._run_interrupted
                 
         except Exception as critical_error:
             logger.critical(f"Critical failure: {critical_error}")
@@ -255,15 +466,17 @@ class YahooFinanceScraper:
             # or re-raise if strictly required. 
             # For generator, we stop yielding.
         finally:
-            self.close()
+            if close_when_done:
+                self.close()
 
 if __name__ == "__main__":
     scraper = YahooFinanceScraper(headless=True)
-    data = []
+    data = YahooFinanceScraper.empty_columns()
+    total = 0
     print("Starting scraper...")
-    for page, total, current_data in scraper.run():
-        data = current_data
+    for page, total, page_data in scraper.run():
+        extend_columns(data, page_data)
         print(f"Progress: Page {page} done, {total} rows collected.")
     
     # Optional: Save to CSV or Process Logic
-    print(f"Scraping completed. Total records: {len(data)}")
+    print(f"Scraping completed. Total records: {total}")